@@ -1,19 +1,56 @@
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from starlette.concurrency import run_in_threadpool
 from app.schemas import AppOnboardRequest, MonitoringDecision
-from app.permission import detect_monitoring_strategy, apply_monitoring_strategy
-from app.redis_client import save_monitoring_strategy, get_monitoring_strategy
+from app.permission import (
+    detect_monitoring_strategy,
+    apply_monitoring_strategy,
+    open_http_client,
+    close_http_client,
+    DetectionInconclusive,
+)
+from app.prometheus_dynamic import warm_prometheus_connection
+from app.redis_client import (
+    save_monitoring_strategy,
+    get_monitoring_strategy,
+    lookup_monitoring_strategy,
+    delete_monitoring_strategy,
+    get_cache_stats,
+    close_redis,
+)
+from app.config import settings
+
+# Root stays at INFO so httpx/httpcore/hpack/asyncio don't log every probe;
+# our own debug output (action results, configured pipelines) only in development
+logging.basicConfig(level=logging.INFO)
+logging.getLogger("app").setLevel(logging.DEBUG if settings.ENV == "development" else logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Clients are opened per lifespan so a shutdown/startup cycle gets fresh ones
+    await open_http_client()
+    await run_in_threadpool(warm_prometheus_connection)
+    yield
+    await close_http_client()
+    await close_redis()
+
 
 app = FastAPI(
     title="Auto-Monitoring Orchestrator",
     description="Automatic onboarding and monitoring strategy detection",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 
 @app.post("/onboard", response_model=MonitoringDecision)
-def onboard_app(app_data: AppOnboardRequest):
+async def onboard_app(app_data: AppOnboardRequest):
     """
     Onboard a new application:
+    - Return the cached strategy if the app was classified recently
     - Detect its monitoring strategy
     - Apply the appropriate monitoring actions
     - Persist the decision in Redis
@@ -21,25 +58,51 @@ def onboard_app(app_data: AppOnboardRequest):
     payload = app_data.model_dump()
     payload["url"] = str(payload["url"])
 
-    # Step 1: Detect monitoring strategy
-    decision = detect_monitoring_strategy(payload)
+    # Step 0: Serve recently detected strategies from the Redis cache
+    cached = await lookup_monitoring_strategy(payload["url"])
+    if cached:
+        return cached
 
-    # Step 2: Apply monitoring actions
-    action_result = apply_monitoring_strategy(payload, decision)
-    print("Action Result:", action_result)  # debug logs
+    # Step 1: Detect monitoring strategy (bounded by PROBE_BUDGET inside the detector)
+    try:
+        decision = await detect_monitoring_strategy(payload)
+    except DetectionInconclusive as e:
+        # Not cached: a slow probe run or resolver hiccup says nothing lasting about the app
+        return {"monitorable": False, "strategy": None, "confidence": "none", "details": str(e)}
+
+    # Step 2: Apply monitoring actions (file + reload I/O, keep it off the event loop)
+    action_result = await run_in_threadpool(apply_monitoring_strategy, payload, decision)
+    logger.debug("Action Result: %s", action_result)
 
     # Step 3: Persist strategy to Redis
-    save_monitoring_strategy(payload["url"], decision)
+    await save_monitoring_strategy(payload["url"], decision)
 
     return decision
 
 
-@app.get("/strategy/{app_url}", response_model=MonitoringDecision)
-def get_saved_strategy(app_url: str):
+@app.get("/strategy/{app_url:path}", response_model=MonitoringDecision)
+async def get_saved_strategy(app_url: str):
     """
     Retrieve the saved monitoring strategy for an application from Redis
     """
-    saved = get_monitoring_strategy(app_url)
+    saved = await get_monitoring_strategy(app_url)
     if not saved:
         return {"monitorable": False, "strategy": None, "confidence": "none", "details": "No strategy found"}
     return saved
+
+
+@app.delete("/strategy/{app_url:path}")
+async def invalidate_strategy(app_url: str):
+    """
+    Drop the cached monitoring strategy so the next onboard re-probes the app
+    """
+    await delete_monitoring_strategy(app_url)
+    return {"status": "invalidated", "url": app_url}
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Strategy cache hit / miss counters and number of completed onboards
+    """
+    return await get_cache_stats()
@@ -1,125 +1,279 @@
-import requests
+import asyncio
+import logging
 import socket
+import httpx
+from cachetools import TTLCache
 from typing import Dict
-from urllib.parse import urlparse
+from app.urls import parse_url
 from app.prometheus_dynamic import configure_prometheus_scrape
 
+logger = logging.getLogger(__name__)
+
 PROM_TIMEOUT = 3
 OTEL_TIMEOUT = 2
 STATSD_PORT = 8125
+STATSD_TIMEOUT = 2
+DNS_TIMEOUT = 2
+DNS_CACHE_TTL = 60
+BLACKBOX_TIMEOUT = 5
+# HTTP probes: fail fast on connect, allow the per-probe timeout for the response
+CONNECT_TIMEOUT = 1.0
+WRITE_TIMEOUT = 1.0
+POOL_TIMEOUT = 1.0
+PROBE_BUDGET = 8.0  # overall cap on detect_monitoring_strategy, in seconds
+
+
+class DetectionInconclusive(Exception):
+    """Detection couldn't reach a verdict worth applying or caching (DNS failure, probe budget ran out)"""
+
+
+def _timeout(read: float) -> httpx.Timeout:
+    return httpx.Timeout(connect=CONNECT_TIMEOUT, read=read, write=WRITE_TIMEOUT, pool=POOL_TIMEOUT)
+
+
+# HTTP/2 needs the optional h2 package (httpx[http2]); fall back to HTTP/1.1 keep-alive
+try:
+    import h2  # noqa: F401
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+# Shared client so same-origin probes multiplex (HTTP/2) or reuse pooled connections.
+# Owned by the app lifespan; recreated lazily if used after a shutdown closed it.
+_client: httpx.AsyncClient | None = None
+
+
+def _http() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=_HTTP2,
+            timeout=_timeout(PROM_TIMEOUT),
+            limits=httpx.Limits(max_keepalive_connections=100, keepalive_expiry=30)
+        )
+    return _client
+
+
+async def open_http_client():
+    _http()
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
 
 
 # ---------- PROMETHEUS ----------
 
-def check_prometheus_metrics(base_url: str, headers=None) -> bool:
+async def fetch_metrics(base_url: str, headers=None) -> httpx.Response | None:
+    """GET /metrics once; the response feeds both Prometheus checks and header detection"""
     try:
-        r = requests.get(
+        return await _http().get(
             f"{base_url}/metrics",
             headers=headers or {},
-            timeout=PROM_TIMEOUT
+            timeout=_timeout(PROM_TIMEOUT)
         )
-        return r.status_code == 200 and "HELP" in r.text
     except Exception:
-        return False
+        return None
 
 
-def check_prometheus_auth(base_url: str) -> bool:
-    try:
-        r = requests.get(f"{base_url}/metrics", timeout=PROM_TIMEOUT)
-        return r.status_code in [401, 403]
-    except Exception:
-        return False
+def check_prometheus_metrics(r: httpx.Response | None) -> bool:
+    return r is not None and r.status_code == 200 and "HELP" in r.text
 
 
-# ---------- OPENTELEMETRY ----------
+def check_prometheus_auth(r: httpx.Response | None) -> bool:
+    return r is not None and r.status_code in [401, 403]
 
-def check_otlp_http(base_url: str) -> bool:
-    otlp_paths = ["/v1/traces", "/v1/metrics"]
-    for path in otlp_paths:
-        try:
-            r = requests.post(f"{base_url}{path}", timeout=OTEL_TIMEOUT)
-            if r.status_code in [200, 404, 415]:
+
+# ---------- DNS ----------
+
+# host -> resolved addresses, so repeat onboards and the TCP probes skip getaddrinfo
+_DNS_CACHE = TTLCache(maxsize=1024, ttl=DNS_CACHE_TTL)
+
+
+async def resolve_host(host: str, timeout: float = DNS_TIMEOUT) -> list[str] | None:
+    """
+    Every address host resolves to (IPv4 and IPv6), or None if it doesn't resolve
+    within timeout. Only successes are cached.
+    """
+    addrs = _DNS_CACHE.get(host)
+    if addrs:
+        return addrs
+    try:
+        infos = await asyncio.wait_for(
+            asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM),
+            timeout
+        )
+    except (OSError, ValueError, asyncio.TimeoutError):
+        # ValueError covers UnicodeError from IDNA-invalid names (e.g. a label over 63 chars)
+        return None
+    addrs = list(dict.fromkeys(info[4][0] for info in infos))
+    if not addrs:
+        return None
+    _DNS_CACHE[host] = addrs
+    return addrs
+
+
+async def _any_true(coros) -> bool:
+    """Run coros concurrently; True as soon as one returns True, cancelling the rest"""
+    pending = {asyncio.create_task(coro) for coro in coros}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if any(task.result() for task in done):
                 return True
-        except Exception:
-            continue
-    return False
+        return False
+    finally:
+        for task in pending:
+            task.cancel()
+
 
+# ---------- TCP ----------
 
-def check_otlp_grpc(host: str, port: int = 4317) -> bool:
+async def check_tcp(host: str, port: int, timeout: float) -> bool:
+    """True if something accepts a TCP connection on host:port within timeout"""
     try:
-        with socket.create_connection((host, port), timeout=OTEL_TIMEOUT):
-            return True
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        writer.close()
+        await writer.wait_closed()
+        return True
     except Exception:
         return False
 
 
-# ---------- STATSD ----------
+# ---------- OPENTELEMETRY ----------
 
-def check_statsd(host: str, port: int = STATSD_PORT) -> bool:
+async def _probe_otlp_path(url: str) -> bool:
     try:
-        with socket.create_connection((host, port), timeout=2):
-            return True
+        r = await _http().post(url, timeout=_timeout(OTEL_TIMEOUT))
+        return r.status_code in [200, 404, 415]
     except Exception:
         return False
 
 
+async def check_otlp_http(base_url: str) -> bool:
+    otlp_paths = ["/v1/traces", "/v1/metrics"]
+    # Probe both paths at once and stop as soon as either answers
+    return await _any_true(_probe_otlp_path(f"{base_url}{path}") for path in otlp_paths)
+
+
+async def check_otlp_grpc(addrs: list[str], port: int = 4317) -> bool:
+    return await _any_true(check_tcp(addr, port, OTEL_TIMEOUT) for addr in addrs)
+
+
+# ---------- STATSD ----------
+
+async def check_statsd(addrs: list[str], port: int = STATSD_PORT) -> bool:
+    return await _any_true(check_tcp(addr, port, STATSD_TIMEOUT) for addr in addrs)
+
+
 # ---------- CLOUD / K8S ----------
 
+# Header-name prefixes in priority order
+_CLOUD_PREFIXES = (("x-amzn", "aws"), ("x-goog", "gcp"), ("x-ms", "azure"))
+
+
 def detect_kubernetes_env(headers: Dict) -> bool:
-    return "x-kubernetes" in str(headers).lower()
+    return any(k.lower().startswith("x-kubernetes") for k in headers)
 
 
 def detect_cloud_provider(headers: Dict) -> str | None:
-    header_str = str(headers).lower()
-    if "x-amzn" in header_str:
-        return "aws"
-    if "x-goog" in header_str:
-        return "gcp"
-    if "x-ms" in header_str:
-        return "azure"
+    names = [k.lower() for k in headers]
+    for prefix, provider in _CLOUD_PREFIXES:
+        if any(name.startswith(prefix) for name in names):
+            return provider
     return None
 
 
 # ---------- BLACKBOX ----------
 
-def check_blackbox_http(url: str) -> bool:
+async def _blackbox_status_ok(url: str) -> bool:
+    # Only the status matters, so don't download the page body
+    r = await _http().head(url, timeout=_timeout(BLACKBOX_TIMEOUT), follow_redirects=True)
+    if r.status_code in [405, 501]:
+        # Server refuses HEAD: fall back to GET but stream it and never read the body
+        async with _http().stream("GET", url, timeout=_timeout(BLACKBOX_TIMEOUT), follow_redirects=True) as r:
+            return r.status_code < 500
+    return r.status_code < 500
+
+
+async def check_blackbox_http(url: str) -> bool:
     try:
-        r = requests.get(url, timeout=5)
-        return r.status_code < 500
+        # HEAD and the GET fallback share one BLACKBOX_TIMEOUT so the probe fits in PROBE_BUDGET
+        return await asyncio.wait_for(_blackbox_status_ok(url), BLACKBOX_TIMEOUT)
     except Exception:
         return False
 
 #--------------Loki Check--------------
 LOKI_TIMEOUT = 3
 
-def check_loki_endpoint(base_url: str) -> bool:
+async def check_loki_endpoint(base_url: str) -> bool:
     try:
-        r = requests.get(f"{base_url}/loki/api/v1/labels", timeout=LOKI_TIMEOUT)
+        r = await _http().get(f"{base_url}/loki/api/v1/labels", timeout=_timeout(LOKI_TIMEOUT))
         return r.status_code == 200
     except Exception:
         return False
     
 #----------------Tempo Check--------------
-def check_tempo_endpoint(base_url: str) -> bool:
+async def check_tempo_endpoint(base_url: str) -> bool:
     try:
-        r = requests.get(f"{base_url}/tempo/api/traces", timeout=LOKI_TIMEOUT)
+        r = await _http().get(f"{base_url}/tempo/api/traces", timeout=_timeout(LOKI_TIMEOUT))
         return r.status_code in [200, 404]  # 404 OK if no traces yet
     except Exception:
         return False
 
 # ---------- STRATEGY RESOLVER ----------
 
-def detect_monitoring_strategy(app: Dict) -> Dict:
+async def detect_monitoring_strategy(app: Dict) -> Dict:
     base_url = app["url"]
-    parsed = urlparse(base_url)
+    parsed = parse_url(base_url)
     host = parsed.hostname
 
+    # Start every probe at once, then await them in priority order: the first
+    # positive result wins and the slower, lower-priority probes are cancelled.
+    # Probes still running when PROBE_BUDGET runs out count as negative.
+    deadline = asyncio.get_running_loop().time() + PROBE_BUDGET
+
+    # Resolve once inside the budget: fail fast on NXDOMAIN, and hand every
+    # address to the TCP probes so they skip DNS (HTTP probes keep the hostname
+    # for SNI / Host header)
+    addrs = await resolve_host(host, timeout=min(DNS_TIMEOUT, PROBE_BUDGET))
+    if addrs is None:
+        raise DetectionInconclusive("DNS resolution failed")
+
+    metrics_task = asyncio.create_task(fetch_metrics(base_url))
+    otlp_http_task = asyncio.create_task(check_otlp_http(base_url))
+    otlp_grpc_task = asyncio.create_task(check_otlp_grpc(addrs))
+    statsd_task = asyncio.create_task(check_statsd(addrs))
+    blackbox_task = asyncio.create_task(check_blackbox_http(base_url))
+    tasks = [metrics_task, otlp_http_task, otlp_grpc_task, statsd_task, blackbox_task]
     try:
-        headers = requests.get(base_url, timeout=2).headers
-    except Exception:
-        headers = {}
-
-    if check_prometheus_metrics(base_url):
+        decision = await _rank_probes(deadline, metrics_task, otlp_http_task, otlp_grpc_task, statsd_task, blackbox_task)
+        # A negative verdict only counts if every probe actually answered
+        if not decision["monitorable"] and not all(task.done() for task in tasks):
+            raise DetectionInconclusive("probe budget exceeded")
+        return decision
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _settle(task: asyncio.Task, deadline: float):
+    """Result of task, or None if it hasn't finished by deadline"""
+    if not task.done():
+        remaining = deadline - asyncio.get_running_loop().time()
+        await asyncio.wait({task}, timeout=max(remaining, 0))
+    return task.result() if task.done() else None
+
+
+async def _rank_probes(deadline, metrics_task, otlp_http_task, otlp_grpc_task, statsd_task, blackbox_task) -> Dict:
+    metrics = await _settle(metrics_task, deadline)
+    # Reuse the /metrics response headers instead of a separate GET base_url
+    headers = metrics.headers if metrics is not None else {}
+
+    if check_prometheus_metrics(metrics):
         return {
             "monitorable": True,
             "strategy": "prometheus",
@@ -127,7 +281,7 @@ def detect_monitoring_strategy(app: Dict) -> Dict:
             "details": "/metrics endpoint detected"
         }
 
-    if check_prometheus_auth(base_url):
+    if check_prometheus_auth(metrics):
         return {
             "monitorable": True,
             "strategy": "prometheus-auth",
@@ -135,7 +289,7 @@ def detect_monitoring_strategy(app: Dict) -> Dict:
             "details": "/metrics exists but requires auth"
         }
 
-    if check_otlp_http(base_url):
+    if await _settle(otlp_http_task, deadline):
         return {
             "monitorable": True,
             "strategy": "opentelemetry-http",
@@ -143,7 +297,7 @@ def detect_monitoring_strategy(app: Dict) -> Dict:
             "details": "OTLP HTTP endpoint detected"
         }
 
-    if check_otlp_grpc(host):
+    if await _settle(otlp_grpc_task, deadline):
         return {
             "monitorable": True,
             "strategy": "opentelemetry-grpc",
@@ -151,7 +305,7 @@ def detect_monitoring_strategy(app: Dict) -> Dict:
             "details": "OTLP gRPC endpoint detected on port 4317"
         }
 
-    if check_statsd(host):
+    if await _settle(statsd_task, deadline):
         return {
             "monitorable": True,
             "strategy": "statsd",
@@ -176,7 +330,7 @@ def detect_monitoring_strategy(app: Dict) -> Dict:
             "details": f"{cloud.upper()} headers detected"
         }
 
-    if check_blackbox_http(base_url):
+    if await _settle(blackbox_task, deadline):
         return {
             "monitorable": True,
             "strategy": "blackbox-http",
@@ -202,37 +356,13 @@ def detect_monitoring_strategy(app: Dict) -> Dict:
 
 # ---------- ACTIONS ----------
 
-def apply_monitoring_strategy(app: dict, strategy_info: dict):
-    strategy = strategy_info.get("strategy")
-    base_url = app["url"]
-
-    if strategy == "prometheus":
-        return configure_prometheus_scrape(base_url)
-
-    elif strategy == "prometheus-auth":
-        return configure_prometheus_scrape(base_url, auth=True)
-
-    elif strategy == "opentelemetry-http":
-        return configure_otlp_pipeline(base_url, protocol="http")
-
-    elif strategy == "opentelemetry-grpc":
-        host = urlparse(base_url).hostname
-        return configure_otlp_pipeline(host, protocol="grpc")
-
-    elif strategy == "statsd":
-        host = urlparse(base_url).hostname
-        return configure_statsd_exporter(host)
-
-    elif strategy == "kubernetes-auto":
-        return configure_k8s_autodiscovery()
+def _configure_cloud(app: dict, strategy_info: dict):
+    cloud_provider = strategy_info["strategy"].split("-")[0]
+    return configure_cloud_monitoring(cloud_provider)
 
-    elif strategy and strategy.endswith("cloud-metrics"):
-        cloud_provider = strategy.split("-")[0]
-        return configure_cloud_monitoring(cloud_provider)
 
-    elif strategy == "blackbox-http":
-        return configure_blackbox_exporter(base_url)
-    elif strategy_info.get("logs_enabled"):
+def _default_handler(app: dict, strategy_info: dict):
+    if strategy_info.get("logs_enabled"):
         loki_url = strategy_info.get("loki_url", "http://localhost:3100")
         tempo_url = strategy_info.get("tempo_url", "http://localhost:3200")
 
@@ -241,10 +371,25 @@ def apply_monitoring_strategy(app: dict, strategy_info: dict):
 
         return {"loki": loki_config, "tempo": tempo_config}
 
-    
+    return {"status": "skipped", "reason": "No actionable strategy found"}
 
-    else:
-        return {"status": "skipped", "reason": "No actionable strategy found"}
+
+# strategy name -> handler(app, strategy_info)
+_DISPATCH = {
+    "prometheus": lambda app, info: configure_prometheus_scrape(app["url"]),
+    "prometheus-auth": lambda app, info: configure_prometheus_scrape(app["url"], auth=True),
+    "opentelemetry-http": lambda app, info: configure_otlp_pipeline(app["url"], protocol="http"),
+    "opentelemetry-grpc": lambda app, info: configure_otlp_pipeline(parse_url(app["url"]).hostname, protocol="grpc"),
+    "statsd": lambda app, info: configure_statsd_exporter(parse_url(app["url"]).hostname),
+    "kubernetes-auto": lambda app, info: configure_k8s_autodiscovery(),
+    "blackbox-http": lambda app, info: configure_blackbox_exporter(app["url"]),
+    **{f"{provider}-cloud-metrics": _configure_cloud for _, provider in _CLOUD_PREFIXES},
+}
+
+
+def apply_monitoring_strategy(app: dict, strategy_info: dict):
+    strategy = strategy_info.get("strategy")
+    return _DISPATCH.get(strategy, _default_handler)(app, strategy_info)
     
 # def configure_prometheus_scrape(url: str, auth=False):
 #     hostname = urlparse(url).hostname
@@ -279,7 +424,7 @@ def configure_otlp_pipeline(endpoint: str, protocol="http"):
         "endpoint": endpoint,
         "metrics": monitored_metrics
     }
-    print(f"✅ OTEL pipeline configured for {protocol} at {endpoint}:", pipeline_config)
+    logger.debug("✅ OTEL pipeline configured for %s at %s: %s", protocol, endpoint, pipeline_config)
     return pipeline_config
 
 def configure_statsd_exporter(host: str, port: int = 8125):
@@ -295,7 +440,7 @@ def configure_statsd_exporter(host: str, port: int = 8125):
         "port": port,
         "metrics": monitored_metrics
     }
-    print(f"✅ StatsD exporter configured for {host}:{port}:", config)
+    logger.debug("✅ StatsD exporter configured for %s:%s: %s", host, port, config)
     return config
 
 def configure_blackbox_exporter(url: str):
@@ -310,7 +455,7 @@ def configure_blackbox_exporter(url: str):
         "url": url,
         "metrics": monitored_metrics
     }
-    print(f"✅ Blackbox exporter configured for {url}:", config)
+    logger.debug("✅ Blackbox exporter configured for %s: %s", url, config)
     return config
 
 def configure_k8s_autodiscovery():
@@ -323,7 +468,7 @@ def configure_k8s_autodiscovery():
         "kube_node_status_condition"
     ]
     config = {"strategy": "k8s-autodiscovery", "metrics": monitored_metrics}
-    print("✅ Kubernetes autodiscovery enabled:", config)
+    logger.debug("✅ Kubernetes autodiscovery enabled: %s", config)
     return config
 
 def configure_cloud_monitoring(provider: str):
@@ -337,7 +482,7 @@ def configure_cloud_monitoring(provider: str):
         monitored_metrics = []
 
     config = {"cloud_provider": provider, "metrics": monitored_metrics}
-    print(f"✅ Cloud monitoring setup for {provider.upper()}:", config)
+    logger.debug("✅ Cloud monitoring setup for %s: %s", provider.upper(), config)
     return config
 
 
@@ -348,7 +493,7 @@ def configure_loki_pipeline(app_name: str, loki_url: str):
         "log_streams": ["app_logs", "error_logs"],
         "labels": {"app": app_name}
     }
-    print(f"✅ Loki pipeline configured for {app_name}:", config)
+    logger.debug("✅ Loki pipeline configured for %s: %s", app_name, config)
     return config
 
 def configure_tempo_pipeline(app_name: str, tempo_url: str):
@@ -358,5 +503,5 @@ def configure_tempo_pipeline(app_name: str, tempo_url: str):
         "trace_ids": [],
         "sample_rate": 1.0
     }
-    print(f"✅ Tempo pipeline configured for {app_name}:", config)
+    logger.debug("✅ Tempo pipeline configured for %s: %s", app_name, config)
     return config
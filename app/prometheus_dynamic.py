@@ -1,11 +1,81 @@
+import logging
+import threading
+import time
 import yaml
 import requests
+from requests.adapters import HTTPAdapter
 from pathlib import Path
-from urllib.parse import urlparse
+from app.urls import parse_url
+
+# Prefer the libyaml C bindings when PyYAML was built with them
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+logger = logging.getLogger(__name__)
 
 # ---------------- CONFIG ----------------
 PROMETHEUS_CONFIG_PATH = Path("/etc/prometheus/prometheus.yml")  # Update this path if different
 PROMETHEUS_RELOAD_URL = "http://localhost:9090/-/reload"
+PROMETHEUS_READY_URL = "http://localhost:9090/-/ready"
+RELOAD_TIMEOUT = (2, 10)  # (connect, read) seconds
+RELOAD_RETRIES = 3
+RELOAD_BACKOFF = 0.5  # seconds, doubled after each 503
+
+# Pooled session so reloads reuse the connection to Prometheus
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=32, pool_maxsize=64, max_retries=0))
+_SESSION.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=64, max_retries=0))
+_SESSION.headers.update({"Connection": "keep-alive"})
+
+# Parsed prometheus.yml plus its job-name index, reused until the file changes on disk
+_CONFIG_CACHE = {"mtime": None, "data": None, "jobs": None}
+_CONFIG_LOCK = threading.Lock()
+
+
+def warm_prometheus_connection():
+    """Open the pooled connection to Prometheus ahead of the first reload"""
+    try:
+        _SESSION.head(PROMETHEUS_READY_URL, timeout=RELOAD_TIMEOUT)
+    except requests.RequestException as e:
+        logger.warning("Prometheus not reachable at startup: %s", e)
+
+
+def _reload_prometheus() -> requests.Response:
+    """POST /-/reload, backing off while Prometheus answers 503 (reload in progress)"""
+    delay = RELOAD_BACKOFF
+    for _ in range(RELOAD_RETRIES):
+        r = _SESSION.post(PROMETHEUS_RELOAD_URL, timeout=RELOAD_TIMEOUT)
+        if r.status_code != 503:
+            return r
+        time.sleep(delay)
+        delay *= 2
+    return _SESSION.post(PROMETHEUS_RELOAD_URL, timeout=RELOAD_TIMEOUT)
+
+
+def _file_stamp() -> tuple:
+    st = PROMETHEUS_CONFIG_PATH.stat()
+    return st.st_mtime_ns, st.st_size
+
+
+def _load_prometheus_config() -> dict:
+    """Return the parsed config, re-reading the YAML only when the file has changed"""
+    stamp = _file_stamp()
+    if _CONFIG_CACHE["mtime"] == stamp:
+        return _CONFIG_CACHE["data"]
+
+    with open(PROMETHEUS_CONFIG_PATH, "r") as f:
+        config = yaml.load(f, Loader=SafeLoader) or {}
+
+    if "scrape_configs" not in config:
+        config["scrape_configs"] = []
+
+    _CONFIG_CACHE["mtime"] = stamp
+    _CONFIG_CACHE["data"] = config
+    _CONFIG_CACHE["jobs"] = {job["job_name"] for job in config["scrape_configs"]}
+    return config
+
 
 # ---------------- DYNAMIC SCRAPE ----------------
 def add_prometheus_scrape_job(scrape_config: dict) -> bool:
@@ -14,49 +84,53 @@ def add_prometheus_scrape_job(scrape_config: dict) -> bool:
     scrape_config: dict with keys: job_name, metrics_path, targets, auth_required
     """
     try:
-        # Load existing config
-        with open(PROMETHEUS_CONFIG_PATH, "r") as f:
-            config = yaml.safe_load(f) or {}
-
-        if "scrape_configs" not in config:
-            config["scrape_configs"] = []
+        with _CONFIG_LOCK:
+            # Load existing config
+            config = _load_prometheus_config()
 
-        # Avoid duplicate jobs
-        existing_jobs = [job["job_name"] for job in config["scrape_configs"]]
-        if scrape_config["job_name"] in existing_jobs:
-            print(f"⚠ Job {scrape_config['job_name']} already exists, skipping")
-            return False
+            # Avoid duplicate jobs
+            if scrape_config["job_name"] in _CONFIG_CACHE["jobs"]:
+                logger.debug("⚠ Job %s already exists, skipping", scrape_config["job_name"])
+                return False
 
-        # Prepare job entry
-        job_entry = {
-            "job_name": scrape_config["job_name"],
-            "metrics_path": scrape_config.get("metrics_path", "/metrics"),
-            "static_configs": [{"targets": scrape_config.get("targets", [])}],
-        }
-
-        # Add basic auth if needed
-        if scrape_config.get("auth_required"):
-            job_entry["basic_auth"] = {
-                "username": "PROM_USER",  # replace with your username
-                "password": "PROM_PASS"   # replace with your password
+            # Prepare job entry
+            job_entry = {
+                "job_name": scrape_config["job_name"],
+                "metrics_path": scrape_config.get("metrics_path", "/metrics"),
+                "static_configs": [{"targets": scrape_config.get("targets", [])}],
             }
 
-        # Append job and save
-        config["scrape_configs"].append(job_entry)
-        with open(PROMETHEUS_CONFIG_PATH, "w") as f:
-            yaml.safe_dump(config, f)
+            # Add basic auth if needed
+            if scrape_config.get("auth_required"):
+                job_entry["basic_auth"] = {
+                    "username": "PROM_USER",  # replace with your username
+                    "password": "PROM_PASS"   # replace with your password
+                }
+
+            # Append job and save
+            config["scrape_configs"].append(job_entry)
+            try:
+                with open(PROMETHEUS_CONFIG_PATH, "w") as f:
+                    yaml.dump(config, f, Dumper=SafeDumper, default_flow_style=False)
+            except Exception:
+                # In-memory copy no longer matches the file, force a re-read
+                _CONFIG_CACHE["mtime"] = None
+                raise
+
+            _CONFIG_CACHE["mtime"] = _file_stamp()
+            _CONFIG_CACHE["jobs"].add(job_entry["job_name"])
 
         # Reload Prometheus
-        r = requests.post(PROMETHEUS_RELOAD_URL)
+        r = _reload_prometheus()
         if r.status_code == 200:
-            print(f"✅ Prometheus reload successful for job: {scrape_config['job_name']}")
+            logger.debug("✅ Prometheus reload successful for job: %s", scrape_config["job_name"])
             return True
         else:
-            print(f"❌ Failed to reload Prometheus, status_code: {r.status_code}")
+            logger.error("❌ Failed to reload Prometheus, status_code: %s", r.status_code)
             return False
 
     except Exception as e:
-        print(f"❌ Error in dynamic Prometheus config: {e}")
+        logger.error("❌ Error in dynamic Prometheus config: %s", e)
         return False
 
 
@@ -65,14 +139,14 @@ def configure_prometheus_scrape(url: str, auth=False) -> dict:
     """
     Generate Prometheus scrape config and add it dynamically.
     """
-    hostname = urlparse(url).hostname
+    hostname = parse_url(url).hostname
     scrape_config = {
         "job_name": f"auto_{hostname}",
         "metrics_path": "/metrics",
         "targets": [hostname],
         "auth_required": auth
     }
-    print("🔹 Configuring Prometheus scrape:", scrape_config)
+    logger.debug("🔹 Configuring Prometheus scrape: %s", scrape_config)
 
     # Add dynamically
     add_prometheus_scrape_job(scrape_config)
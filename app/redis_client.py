@@ -1,77 +1,113 @@
+import hashlib
+import logging
+import orjson
 import redis
+import redis.asyncio as aioredis
+from app.urls import parse_url
 from app.config import settings
 
-# Connect to Redis
-r = redis.Redis(
+logger = logging.getLogger(__name__)
+
+STRATEGY_TTL = 300  # seconds a detected strategy stays cached
+CACHE_HITS_KEY = "strategy:cache:hits"
+CACHE_MISSES_KEY = "strategy:cache:misses"
+ONBOARDS_KEY = "counter:onboards"
+REDIS_MAX_CONNECTIONS = 50
+REDIS_POOL_TIMEOUT = 5  # seconds to wait for a free pooled connection
+
+# Connect to Redis (async client so handlers don't block the event loop)
+# Blocking pool: once all connections are busy, callers wait up to
+# REDIS_POOL_TIMEOUT for one instead of failing with "Too many connections"
+_pool = aioredis.BlockingConnectionPool(
     host=settings.REDIS_HOST,
     port=settings.REDIS_PORT,
     db=0,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    timeout=REDIS_POOL_TIMEOUT,
     decode_responses=True  # store everything as string
 )
+r = aioredis.Redis(connection_pool=_pool)
 
-def _serialize_strategy(strategy_info: dict) -> dict:
-    """
-    Convert all values in strategy_info to strings.
-    Redis HSET only supports str, int, float, bytes.
-    """
-    serialized = {}
-    for k, v in strategy_info.items():
-        if isinstance(v, bool):
-            serialized[k] = str(v)  # True -> "True", False -> "False"
-        elif v is None:
-            serialized[k] = "None"
-        else:
-            serialized[k] = str(v)
-    return serialized
+# GET a strategy and bump the matching hit / miss counter in a single round trip
+_LOOKUP_SCRIPT = r.register_script("""
+local blob = redis.call('GET', KEYS[1])
+if blob then redis.call('INCR', KEYS[2]) else redis.call('INCR', KEYS[3]) end
+return blob
+""")
 
-def save_monitoring_strategy(app_name: str, strategy_info: dict):
-    """Save strategy info for an app"""
+def _strategy_key(app_url: str) -> str:
+    """Build the cache key for an app: strategy:{host}:{path_hash}"""
+    parsed = parse_url(app_url)
+    host = parsed.netloc or app_url
+    path = parsed.path.rstrip("/")
+    if parsed.query:
+        path = f"{path}?{parsed.query}"
+    path_hash = hashlib.sha1(path.encode()).hexdigest()[:16]
+    return f"strategy:{host}:{path_hash}"
+
+async def save_monitoring_strategy(app_name: str, strategy_info: dict, ttl: int | None = STRATEGY_TTL):
+    """Save strategy info for an app, expiring after ttl seconds"""
     try:
-        serialized_info = _serialize_strategy(strategy_info)
-        r.hset(f"app:{app_name}", mapping=serialized_info)
+        # One round trip for the strategy write and the onboard counter
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.set(_strategy_key(app_name), orjson.dumps(strategy_info), ex=ttl or None)
+            pipe.incr(ONBOARDS_KEY)
+            await pipe.execute()
     except redis.ConnectionError as e:
-        print(f"Redis connection error: {e}")
+        logger.error("Redis connection error: %s", e)
         raise
     except redis.RedisError as e:
-        print(f"Redis error: {e}")
+        logger.error("Redis error: %s", e)
         raise
 
-def get_monitoring_strategy(app_name: str):
+async def get_monitoring_strategy(app_name: str):
     """Retrieve strategy info for an app"""
     try:
-        data = r.hgetall(f"app:{app_name}")
-        if not data:
-            return None
-        # Optional: convert "True"/"False" back to bool
-        for k, v in data.items():
-            if v == "True":
-                data[k] = True
-            elif v == "False":
-                data[k] = False
-            elif v == "None":
-                data[k] = None
-            elif v.isdigit():
-                data[k] = int(v)
-            else:
-                try:
-                    data[k] = float(v)
-                except ValueError:
-                    pass
-        return data
+        blob = await r.get(_strategy_key(app_name))
+        return orjson.loads(blob) if blob else None
+    except redis.ConnectionError as e:
+        logger.error("Redis connection error: %s", e)
+        raise
+    except redis.RedisError as e:
+        logger.error("Redis error: %s", e)
+        raise
+
+async def lookup_monitoring_strategy(app_name: str):
+    """Retrieve strategy info for an onboard, counting the cache hit / miss in the same round trip"""
+    try:
+        blob = await _LOOKUP_SCRIPT(keys=[_strategy_key(app_name), CACHE_HITS_KEY, CACHE_MISSES_KEY])
+        return orjson.loads(blob) if blob else None
     except redis.ConnectionError as e:
-        print(f"Redis connection error: {e}")
+        logger.error("Redis connection error: %s", e)
         raise
     except redis.RedisError as e:
-        print(f"Redis error: {e}")
+        logger.error("Redis error: %s", e)
         raise
 
-def delete_monitoring_strategy(app_name: str):
+async def delete_monitoring_strategy(app_name: str):
     """Remove an app's monitoring info"""
     try:
-        r.delete(f"app:{app_name}")
+        await r.delete(_strategy_key(app_name))
+    except redis.ConnectionError as e:
+        logger.error("Redis connection error: %s", e)
+        raise
+    except redis.RedisError as e:
+        logger.error("Redis error: %s", e)
+        raise
+
+async def get_cache_stats() -> dict:
+    """Return strategy cache hit / miss and onboard counters"""
+    try:
+        hits, misses, onboards = await r.mget(CACHE_HITS_KEY, CACHE_MISSES_KEY, ONBOARDS_KEY)
+        return {"hits": int(hits or 0), "misses": int(misses or 0), "onboards": int(onboards or 0)}
     except redis.ConnectionError as e:
-        print(f"Redis connection error: {e}")
+        logger.error("Redis connection error: %s", e)
         raise
     except redis.RedisError as e:
-        print(f"Redis error: {e}")
+        logger.error("Redis error: %s", e)
         raise
+
+async def close_redis():
+    await r.aclose()
+    # An externally supplied pool isn't closed by the client
+    await _pool.disconnect()
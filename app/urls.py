@@ -0,0 +1,11 @@
+from functools import lru_cache
+from urllib.parse import ParseResult, urlparse
+
+
+@lru_cache(maxsize=1024)
+def parse_url(url: str) -> ParseResult:
+    """
+    Memoized urlparse. The same app URL is parsed by detection, actions,
+    the Prometheus helper and the Redis key builder on every onboard.
+    """
+    return urlparse(url)
@@ -0,0 +1,64 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main, permission
+
+
+def test_http_client_survives_lifespan_restart(monkeypatch):
+    monkeypatch.setattr(main, "warm_prometheus_connection", lambda: None)
+
+    with TestClient(main.app):
+        pass
+    assert permission._client is None
+
+    # A second startup (reused TestClient, embedded server restart) must get a working client
+    with TestClient(main.app):
+        assert permission._client is not None
+        assert not permission._client.is_closed
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    """Stub out Redis and Prometheus; returns the lists of saved decisions and applied actions"""
+    saved, applied = [], []
+
+    async def no_cached_strategy(url):
+        return None
+
+    async def noop(*args, **kwargs):
+        pass
+
+    async def save(url, decision):
+        saved.append(decision)
+
+    monkeypatch.setattr(main, "warm_prometheus_connection", lambda: None)
+    monkeypatch.setattr(main, "lookup_monitoring_strategy", no_cached_strategy)
+    monkeypatch.setattr(main, "save_monitoring_strategy", save)
+    monkeypatch.setattr(main, "close_redis", noop)
+    monkeypatch.setattr(main, "apply_monitoring_strategy", lambda *args: applied.append(args))
+    return saved, applied
+
+
+def onboard(url):
+    with TestClient(main.app) as client:
+        return client.post("/onboard", json={"type": "backend", "framework": None, "url": url})
+
+
+def test_inconclusive_detection_is_neither_applied_nor_cached(monkeypatch, offline):
+    async def over_budget(payload):
+        raise permission.DetectionInconclusive("probe budget exceeded")
+    monkeypatch.setattr(main, "detect_monitoring_strategy", over_budget)
+
+    r = onboard("http://app.test")
+
+    assert r.status_code == 200
+    assert r.json()["details"] == "probe budget exceeded"
+    assert offline == ([], [])
+
+
+def test_idna_invalid_host_is_not_monitorable_instead_of_500(offline):
+    r = onboard("http://" + "a" * 64 + ".com")
+
+    assert r.status_code == 200
+    assert r.json()["details"] == "DNS resolution failed"
+    assert offline == ([], [])
@@ -0,0 +1,150 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app import permission
+
+URL = "http://app.test"
+real_resolve_host = permission.resolve_host
+
+
+@pytest.fixture(autouse=True)
+def resolved(monkeypatch):
+    async def fake_resolve_host(host, timeout=permission.DNS_TIMEOUT):
+        return ["127.0.0.1"]
+    monkeypatch.setattr(permission, "resolve_host", fake_resolve_host)
+
+
+def use_transport(monkeypatch, handler):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(permission, "_client", client)
+
+
+def use_tcp(monkeypatch, open_ports=(), delay=0.0):
+    async def fake_check_tcp(host, port, timeout):
+        await asyncio.sleep(delay)
+        return port in open_ports
+    monkeypatch.setattr(permission, "check_tcp", fake_check_tcp)
+
+
+def routes(table, default=503):
+    """MockTransport handler answering (method, path) from table; coroutine values are awaited"""
+    async def handler(request):
+        answer = table.get((request.method, request.url.path), default)
+        if callable(answer):
+            answer = await answer()
+        if isinstance(answer, int):
+            return httpx.Response(answer)
+        return answer
+    return handler
+
+
+async def hang():
+    await asyncio.sleep(3600)
+
+
+def detect():
+    return asyncio.run(permission.detect_monitoring_strategy({"url": URL}))
+
+
+def test_positive_metrics_returns_without_waiting_for_slower_probes(monkeypatch):
+    use_transport(monkeypatch, routes({("GET", "/metrics"): httpx.Response(200, text="# HELP up")}))
+    use_tcp(monkeypatch, delay=5)
+
+    start = time.monotonic()
+    decision = detect()
+
+    assert decision["strategy"] == "prometheus"
+    assert time.monotonic() - start < 1
+
+
+def test_finished_lower_priority_probe_wins_when_higher_priority_hangs(monkeypatch):
+    monkeypatch.setattr(permission, "PROBE_BUDGET", 0.3)
+    use_transport(monkeypatch, routes({("GET", "/metrics"): hang}))
+    use_tcp(monkeypatch, open_ports={permission.STATSD_PORT})
+
+    start = time.monotonic()
+    decision = detect()
+
+    assert decision["strategy"] == "statsd"
+    assert time.monotonic() - start < 1
+
+
+def test_budget_exceeded_only_when_nothing_positive_finished(monkeypatch):
+    monkeypatch.setattr(permission, "PROBE_BUDGET", 0.3)
+    use_transport(monkeypatch, routes({("HEAD", "/"): hang}))
+    use_tcp(monkeypatch)
+
+    start = time.monotonic()
+    with pytest.raises(permission.DetectionInconclusive, match="probe budget exceeded"):
+        detect()
+    assert time.monotonic() - start < 1
+
+
+def test_all_probes_negative_is_a_definitive_verdict(monkeypatch):
+    use_transport(monkeypatch, routes({}))
+    use_tcp(monkeypatch)
+
+    decision = detect()
+
+    assert decision["monitorable"] is False
+    assert decision["next_steps"]
+
+
+def test_blackbox_head_then_get_fallback_shares_one_timeout(monkeypatch):
+    monkeypatch.setattr(permission, "BLACKBOX_TIMEOUT", 0.2)
+    use_transport(monkeypatch, routes({("HEAD", "/"): 405, ("GET", "/"): hang}))
+
+    start = time.monotonic()
+    assert asyncio.run(permission.check_blackbox_http(URL + "/")) is False
+    assert time.monotonic() - start < 1
+
+
+@pytest.mark.parametrize("table, open_ports, strategy", [
+    ({("GET", "/metrics"): httpx.Response(200, text="# HELP up"), ("POST", "/v1/traces"): 200},
+     {4317}, "prometheus"),
+    ({("GET", "/metrics"): 401, ("POST", "/v1/traces"): 200}, (), "prometheus-auth"),
+    ({("POST", "/v1/metrics"): 415}, {4317, permission.STATSD_PORT}, "opentelemetry-http"),
+    ({}, {4317, permission.STATSD_PORT}, "opentelemetry-grpc"),
+    ({("GET", "/metrics"): httpx.Response(404, headers={"X-Kubernetes-Pod": "p", "X-Amzn-Trace-Id": "t"})},
+     (), "kubernetes-auto"),
+    ({("GET", "/metrics"): httpx.Response(404, headers={"X-Amzn-Trace-Id": "t"}), ("HEAD", "/"): 200},
+     (), "aws-cloud-metrics"),
+    ({("HEAD", "/"): 200}, (), "blackbox-http"),
+])
+def test_priority_order(monkeypatch, table, open_ports, strategy):
+    use_transport(monkeypatch, routes(table))
+    use_tcp(monkeypatch, open_ports=open_ports)
+
+    assert detect()["strategy"] == strategy
+
+
+def test_idna_invalid_host_is_unresolvable_not_an_error():
+    host = "a" * 64 + ".com"
+
+    assert asyncio.run(real_resolve_host(host)) is None
+
+
+def test_dns_failure_is_inconclusive(monkeypatch):
+    async def nxdomain(host, timeout=permission.DNS_TIMEOUT):
+        return None
+    monkeypatch.setattr(permission, "resolve_host", nxdomain)
+
+    with pytest.raises(permission.DetectionInconclusive, match="DNS resolution failed"):
+        detect()
+
+
+def test_tcp_probes_try_every_resolved_address(monkeypatch):
+    async def dual_stack(host, timeout=permission.DNS_TIMEOUT):
+        return ["::1", "127.0.0.1"]
+
+    async def ipv4_only_collector(host, port, timeout):
+        return host == "127.0.0.1" and port == 4317
+
+    monkeypatch.setattr(permission, "resolve_host", dual_stack)
+    monkeypatch.setattr(permission, "check_tcp", ipv4_only_collector)
+    use_transport(monkeypatch, routes({}))
+
+    assert detect()["strategy"] == "opentelemetry-grpc"
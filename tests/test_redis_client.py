@@ -0,0 +1,54 @@
+import asyncio
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+import redis.asyncio as aioredis
+
+from app import redis_client
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fake = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(redis_client, "r", fake)
+    monkeypatch.setattr(redis_client, "_LOOKUP_SCRIPT", fake.register_script(redis_client._LOOKUP_SCRIPT.script))
+    return fake
+
+
+def test_lookup_counts_hits_and_misses_in_one_call(fake_redis):
+    url = "http://app.test/"
+    decision = {"monitorable": False, "strategy": None, "next_steps": ["Expose /metrics"]}
+
+    async def scenario():
+        miss = await redis_client.lookup_monitoring_strategy(url)
+        await redis_client.save_monitoring_strategy(url, decision)
+        hit = await redis_client.lookup_monitoring_strategy(url)
+        return miss, hit, await redis_client.get_cache_stats()
+
+    miss, hit, stats = asyncio.run(scenario())
+
+    assert miss is None
+    assert hit == decision
+    assert stats == {"hits": 1, "misses": 1, "onboards": 1}
+
+
+def test_more_concurrent_calls_than_pooled_connections_wait_instead_of_failing(monkeypatch):
+    # Same pool class and limits as production, backed by an in-memory server
+    pool = type(redis_client._pool)(
+        connection_class=fakeredis.aioredis.FakeAsyncRedisConnection,
+        server=fakeredis.FakeServer(),
+        max_connections=redis_client.REDIS_MAX_CONNECTIONS,
+        timeout=redis_client.REDIS_POOL_TIMEOUT,
+        decode_responses=True
+    )
+    client = aioredis.Redis(connection_pool=pool)
+    monkeypatch.setattr(redis_client, "r", client)
+    monkeypatch.setattr(redis_client, "_LOOKUP_SCRIPT", client.register_script(redis_client._LOOKUP_SCRIPT.script))
+
+    async def burst():
+        calls = redis_client.REDIS_MAX_CONNECTIONS + 20
+        await asyncio.gather(*(redis_client.lookup_monitoring_strategy(f"http://app{i}.test") for i in range(calls)))
+        return await redis_client.get_cache_stats()
+
+    assert asyncio.run(burst())["misses"] == redis_client.REDIS_MAX_CONNECTIONS + 20